@@ -9,12 +9,13 @@ from dotenv import load_dotenv
 load_dotenv()
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
 MODEL_ID = os.getenv("MODEL_ID", "qwen/qwen-2-vl-72b-instruct")
 SITE_URL = os.getenv("SITE_URL", "http://localhost:3000")
 APP_NAME = os.getenv("APP_NAME", "Snap-2-Track")
 
 client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
+    base_url=OPENROUTER_BASE_URL,
     api_key=OPENROUTER_API_KEY,
     default_headers={
         "HTTP-Referer": SITE_URL,
@@ -64,41 +65,82 @@ async def analyze_image_local(image_bytes: bytes, context: str = "", language: s
     """
 
     print(f"🚀 Sending request to OpenRouter ({MODEL_ID})... [Lang: {language}]")
-    start_time = time.time()
+    return _run_completion(
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": [{"type": "image_url", "image_url": {"url": image_url}}]}
+        ],
+        temperature=0.4,
+        max_tokens=1000
+    )
 
-    try:
-        response = client.chat.completions.create(
-            model=MODEL_ID,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": [{"type": "image_url", "image_url": {"url": image_url}}]}
-            ],
-            temperature=0.4,
-            max_tokens=1000,
-            extra_body={"include_usage": True}
-        )
-        
-        latency = time.time() - start_time
-        cost = _extract_cost(response)
-        raw_metadata = response.model_dump() if hasattr(response, 'model_dump') else response.__dict__
-        
-        data = _clean_json(response.choices[0].message.content)
-        
-        return {
-            "data": data,
-            "cost": cost,
-            "latency": latency,
-            "metadata": raw_metadata
-        }
+async def analyze_meal_images(images: list, context: str = "", language: str = "en"):
+    """Analyzes several photos of one meal in a single request (per-item nutrition + meal total)."""
+    image_parts = [
+        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64.b64encode(img).decode('utf-8')}"}}
+        for img in images
+    ]
 
-    except Exception as e:
-        print(f"❌ OpenRouter API Error: {str(e)}")
-        return {
-            "data": _error_data(str(e)),
-            "cost": 0.0,
-            "latency": time.time() - start_time,
-            "metadata": {"error": str(e)}
-        }
+    schema_definition = """
+    {
+        "is_food": boolean,
+        "meal_name": "Short name for the whole meal",
+        "meal_type": "breakfast|lunch|dinner|snack",
+        "items": [
+            {
+                "item_name": "Short name",
+                "is_composed_meal": boolean,
+                "estimated_weight_g": <int>,
+                "nutrition": {
+                    "calories_kcal": <int>,
+                    "protein_g": <int>,
+                    "carbs_g": <int>,
+                    "fat_g": <int>,
+                    "fiber_g": <int>
+                },
+                "dietary_flags": ["string"],
+                "confidence_score": <float 0.0-1.0>,
+                "reasoning": "Technical reasoning"
+            }
+        ],
+        "total": {
+            "calories_kcal": <int>,
+            "protein_g": <int>,
+            "carbs_g": <int>,
+            "fat_g": <int>,
+            "fiber_g": <int>
+        },
+        "reply_text": "Response to user"
+    }
+    """
+
+    system_prompt = f"""You are 'Snap-2-Track', a culinary expert with a sharp eye for nutrition.
+    The user sent {len(images)} photos of ONE meal. Context provided by user: "{context}"
+
+    GUIDELINES FOR 'items':
+    1. List every distinct food item across all photos exactly once. The same item seen in several photos is ONE item.
+    2. 'total' MUST be the sum of all items.
+
+    GUIDELINES FOR 'reply_text':
+    1. **Natural & Varied:** React to the meal naturally. **Do NOT** start with "The image shows", "This is", or "I see".
+    2. **Macros:** You MUST explicitly weave the meal's total macro numbers into the narrative.
+    3. **Length:** Keep it concise (2-3 sentences max).
+    4. **NO PREACHING:** No health advice, no judgment. Just the food facts and the vibe.
+    5. **LANGUAGE:** You MUST write the 'reply_text', 'meal_name' and every 'item_name' in this language: [{language}]. The JSON keys must remain in English.
+
+    Return ONLY valid JSON:
+    {schema_definition}
+    """
+
+    print(f"🚀 Sending {len(images)} images to OpenRouter ({MODEL_ID})... [Lang: {language}]")
+    return _run_completion(
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": image_parts}
+        ],
+        temperature=0.4,
+        max_tokens=1000 + 400 * (len(images) - 1)
+    )
 
 async def analyze_text_correction(current_log: dict, user_text: str, language: str = "en"):
     prompt = f"""
@@ -108,6 +150,8 @@ async def analyze_text_correction(current_log: dict, user_text: str, language: s
     
     Task:
     1. Update 'item_name', 'nutrition' totals based on the user's input.
+       - If the data has 'items', update (or add/remove) the affected items and keep 'total' and 'nutrition' equal to the sum of all items.
+       - Keep every existing 'log_id' unchanged on the same food. New items get no 'log_id'.
     2. 'reply_text': Acknowledge the change naturally and professionally in [{language}].
        - Example: "Got it, added the extra slice. That brings it to..."
        - Confirm the new total macros in the text.
@@ -115,33 +159,53 @@ async def analyze_text_correction(current_log: dict, user_text: str, language: s
 
     Return ONLY the updated JSON.
     """
+    return _run_completion(
+        [{"role": "user", "content": prompt}],
+        temperature=0.2,
+        fallback=current_log,
+        error_label="Correction Error"
+    )
+
+def _run_completion(messages: list, temperature: float, max_tokens: int = None,
+                    fallback: dict = None, error_label: str = "OpenRouter API Error"):
+    """
+    Shared completion call: returns {data, cost, latency, metrics, metadata}. On failure
+    'data' is the fallback (default: an error reply) so callers never have to catch.
+    """
     start_time = time.time()
+    options = {"max_tokens": max_tokens} if max_tokens else {}
     try:
         response = client.chat.completions.create(
             model=MODEL_ID,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-            extra_body={"include_usage": True}
+            messages=messages,
+            temperature=temperature,
+            extra_body={"include_usage": True},
+            **options
         )
-        
+
         latency = time.time() - start_time
         cost = _extract_cost(response)
+        metrics = _extract_metrics(response)
         raw_metadata = response.model_dump() if hasattr(response, 'model_dump') else response.__dict__
-        data = _clean_json(response.choices[0].message.content)
-        
+
+        # Single-item replies have no 'items' and pass through _normalize_meal unchanged
+        data = _normalize_meal(_clean_json(response.choices[0].message.content))
+
         return {
             "data": data,
             "cost": cost,
             "latency": latency,
+            "metrics": metrics,
             "metadata": raw_metadata
         }
-        
+
     except Exception as e:
-        print(f"❌ Correction Error: {e}")
+        print(f"❌ {error_label}: {str(e)}")
         return {
-            "data": current_log, 
-            "cost": 0.0, 
+            "data": fallback if fallback is not None else _error_data(str(e)),
+            "cost": 0.0,
             "latency": time.time() - start_time,
+            "metrics": {},
             "metadata": {"error": str(e)}
         }
 
@@ -154,6 +218,42 @@ def _extract_cost(response):
         print(f"⚠️ Could not extract cost: {e}")
     return 0.0
 
+def _normalize_meal(data: dict):
+    """Fills the single-item keys (item_name, nutrition) so multi-item results stay compatible."""
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        return data
+
+    for item in items:
+        item.setdefault("meal_type", data.get("meal_type", "snack"))
+
+    total = {key: sum(item.get("nutrition", {}).get(key, 0) or 0 for item in items)
+             for key in ("calories_kcal", "protein_g", "carbs_g", "fat_g", "fiber_g")}
+    data["total"] = total
+    data["nutrition"] = total
+    data.setdefault("item_name", data.get("meal_name") or ", ".join(item.get("item_name", "") for item in items))
+    return data
+
+def _extract_metrics(response):
+    """Pulls the fields we query on out of the provider response."""
+    metrics = {
+        "provider_model": getattr(response, 'model', None),
+        "provider_response_id": getattr(response, 'id', None),
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "finish_reason": None,
+    }
+    try:
+        usage = getattr(response, 'usage', None)
+        if usage:
+            metrics["prompt_tokens"] = int(getattr(usage, 'prompt_tokens', 0) or 0)
+            metrics["completion_tokens"] = int(getattr(usage, 'completion_tokens', 0) or 0)
+        if response.choices:
+            metrics["finish_reason"] = response.choices[0].finish_reason
+    except Exception as e:
+        print(f"⚠️ Could not extract metrics: {e}")
+    return metrics
+
 def _clean_json(text: str):
     text = text.replace("```json", "").replace("```", "").strip()
     start_idx = text.find('{')
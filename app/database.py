@@ -1,5 +1,6 @@
 # snap-2-track-backend/app/database.py
 from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import inspect, text
 import os
 from dotenv import load_dotenv
 
@@ -19,8 +20,36 @@ else:
 # Echo=False for production noise reduction
 engine = create_engine(DATABASE_URL, echo=False)
 
+# Columns added to existing tables after their creation. create_all() only creates
+# missing tables, so these are added on startup to keep old databases insertable.
+ADDED_COLUMNS = {
+    "message": {
+        "provider_model": "VARCHAR",
+        "provider_response_id": "VARCHAR",
+        "prompt_tokens": "INTEGER DEFAULT 0",
+        "completion_tokens": "INTEGER DEFAULT 0",
+        "finish_reason": "VARCHAR",
+    },
+    "nutrition_log": {
+        "position": "INTEGER DEFAULT 0",
+    },
+}
+
 def init_db():
     SQLModel.metadata.create_all(engine)
+    ensure_added_columns()
+
+def ensure_added_columns():
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, columns in ADDED_COLUMNS.items():
+            if not inspector.has_table(table):
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table)}
+            for name, ddl in columns.items():
+                if name not in existing:
+                    print(f"🛠️  Adding column {table}.{name}")
+                    conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {name} {ddl}'))
 
 def get_session():
     with Session(engine) as session:
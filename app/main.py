@@ -1,15 +1,29 @@
 # app/main.py
 import os
-from fastapi import FastAPI, UploadFile, Form, Depends, File, HTTPException, Response, Body, Security
+import asyncio
+from fastapi import FastAPI, UploadFile, Form, Depends, File, HTTPException, Response, Body, Security, Query
+from fastapi.responses import StreamingResponse
 from fastapi.security import APIKeyHeader
+from starlette.concurrency import run_in_threadpool
 # CORS middleware removed for internal proxy architecture
 from sqlmodel import Session, select
-from .database import init_db, get_session
+from .database import init_db, get_session, engine
 from .models import ImageStore
-from .orchestrator import handle_message, get_user_history_summary, delete_meal, get_chat_history, reset_user, update_meal_nutrition
+from .schemas import HistoryDayOut, ChatMessageOut
+from .responses import FastJSONResponse
+from .compression import CompressionMiddleware
+from .portability import FORMATS, find_user, stream_user_export, import_user_history
+from .orchestrator import handle_message, get_user_history_summary, delete_meal, get_chat_history, reset_user, update_meal_nutrition, purge_provider_archive, load_provider_response
 from uuid import UUID
+from typing import List
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
+
+MAX_IMAGES_PER_MESSAGE = int(os.getenv("MAX_IMAGES_PER_MESSAGE", "6"))
+PROVIDER_ARCHIVE_PURGE_INTERVAL_HOURS = float(os.getenv("PROVIDER_ARCHIVE_PURGE_INTERVAL_HOURS", "24"))
+
+# Compress JSON/NDJSON/CSV bodies above the threshold (images are passed through)
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")))
 
 # --- Security Configuration ---
 API_KEY_NAME = "X-API-Key"
@@ -28,32 +42,90 @@ def get_api_key(api_key: str = Security(api_key_header)):
     return api_key
 # ------------------------------
 
+def _purge_archive():
+    with Session(engine) as session:
+        purge_provider_archive(session)
+
+async def _purge_archive_periodically():
+    # Long-running containers must keep enforcing the retention policy, not just at boot
+    while True:
+        try:
+            await run_in_threadpool(_purge_archive)
+        except Exception as e:
+            print(f"⚠️ Provider archive purge failed: {e}")
+        await asyncio.sleep(PROVIDER_ARCHIVE_PURGE_INTERVAL_HOURS * 3600)
+
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     init_db()
+    app.state.purge_task = asyncio.create_task(_purge_archive_periodically())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    app.state.purge_task.cancel()
 
 @app.post("/api/chat", dependencies=[Depends(get_api_key)])
 async def chat_endpoint(
     text: str = Form(None),
     image: UploadFile = File(None),
+    images: List[UploadFile] = File(None),
     user_id: str = Form(...),
     language: str = Form("en"),
     session: Session = Depends(get_session)
 ):
-    image_bytes = None
-    if image:
-        image_bytes = await image.read()
+    # 'image' (single upload) is kept for existing clients; 'images' carries multi-photo meals
+    uploads = ([image] if image else []) + (images or [])
+    if len(uploads) > MAX_IMAGES_PER_MESSAGE:
+        raise HTTPException(status_code=400, detail=f"Too many images (max {MAX_IMAGES_PER_MESSAGE})")
+
+    image_list = [await upload.read() for upload in uploads]
     
-    response = await handle_message(session, user_id, text, image_bytes, language)
+    response = await handle_message(session, user_id, text, image_list, language)
     return response
 
-@app.get("/api/history/{user_id}", dependencies=[Depends(get_api_key)])
+# Returning the response directly skips jsonable_encoder and response_model re-validation
+@app.get("/api/history/{user_id}", response_model=List[HistoryDayOut], dependencies=[Depends(get_api_key)])
 def history_endpoint(user_id: str, session: Session = Depends(get_session)):
-    return get_user_history_summary(session, user_id)
+    return FastJSONResponse(get_user_history_summary(session, user_id))
 
-@app.get("/api/chat/{user_id}", dependencies=[Depends(get_api_key)])
+@app.get("/api/chat/{user_id}", response_model=List[ChatMessageOut], dependencies=[Depends(get_api_key)])
 def chat_history_endpoint(user_id: str, session: Session = Depends(get_session)):
-    return get_chat_history(session, user_id)
+    return FastJSONResponse(get_chat_history(session, user_id))
+
+@app.get("/api/export/{user_id}", dependencies=[Depends(get_api_key)])
+def export_endpoint(
+    user_id: str,
+    format: str = Query("ndjson"),
+    include_images: bool = Query(False),
+    session: Session = Depends(get_session)
+):
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format (use {', '.join(FORMATS)})")
+    user = find_user(session, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    return StreamingResponse(
+        stream_user_export(user.id, format, include_images),
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="snap2track-export.{format}"'}
+    )
+
+@app.post("/api/import/{user_id}", dependencies=[Depends(get_api_key)])
+def import_endpoint(
+    user_id: str,
+    file: UploadFile = File(...),
+    format: str = Form("ndjson"),
+    session: Session = Depends(get_session)
+):
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format (use {', '.join(FORMATS)})")
+    try:
+        counts = import_user_history(session, user_id, file.file, format)
+    except (ValueError, KeyError) as e:
+        session.rollback()
+        raise HTTPException(status_code=400, detail=f"Invalid import file: {e}")
+    return {"status": "imported", **counts}
 
 @app.get("/api/image/{image_id}", dependencies=[Depends(get_api_key)])
 def get_image_endpoint(image_id: str, session: Session = Depends(get_session)):
@@ -66,6 +138,18 @@ def get_image_endpoint(image_id: str, session: Session = Depends(get_session)):
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid UUID")
 
+# Audit/debug view of the raw provider payload archived for a bot message
+@app.get("/api/message/{message_id}/provider-response", dependencies=[Depends(get_api_key)])
+def provider_response_endpoint(message_id: str, session: Session = Depends(get_session)):
+    try:
+        uuid_obj = UUID(message_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid UUID")
+    payload = load_provider_response(session, uuid_obj)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="No archived provider response (never stored or past retention)")
+    return payload
+
 @app.delete("/api/meal/{meal_id}", dependencies=[Depends(get_api_key)])
 def delete_meal_endpoint(meal_id: str, session: Session = Depends(get_session)):
     success = delete_meal(session, meal_id)
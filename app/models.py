@@ -39,6 +39,8 @@ class NutritionLog(SQLModel, table=True):
     __tablename__ = "nutrition_log"
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     meal_id: UUID = Field(foreign_key="meal.id")
+    # Order of the item within its meal; the first item carries the meal-level rating
+    position: int = Field(default=0)
     
     item_name: str
     meal_type: str = Field(default="snack")
@@ -78,5 +80,17 @@ class Message(SQLModel, table=True):
     # Financial & Technical Metrics
     cost: float = Field(default=0.0)
     latency_seconds: float = Field(default=0.0)
-    # Store full OpenRouter metadata (model, tokens, finish_reason)
-    provider_response: dict = Field(default={}, sa_column=Column(JSON))
\ No newline at end of file
+    # Compact provider metrics (full payload lives in ProviderResponseArchive)
+    provider_model: Optional[str] = None
+    provider_response_id: Optional[str] = None
+    prompt_tokens: int = Field(default=0)
+    completion_tokens: int = Field(default=0)
+    finish_reason: Optional[str] = None
+
+class ProviderResponseArchive(SQLModel, table=True):
+    __tablename__ = "provider_response_archive"
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    message_id: UUID = Field(foreign_key="message.id", index=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    # zlib-compressed JSON of the raw OpenRouter response
+    payload: bytes = Field(sa_column=Column(LargeBinary))
\ No newline at end of file
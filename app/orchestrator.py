@@ -1,17 +1,22 @@
 # app/orchestrator.py
 import os
 import uuid
-from sqlmodel import Session, select
-from .models import User, Meal, NutritionLog, Message, ImageStore
-from .ai_engine import analyze_image_local, analyze_text_correction
-from datetime import datetime
+from sqlmodel import Session, select, delete
+from .models import User, Meal, NutritionLog, Message, ImageStore, ProviderResponseArchive
+from .ai_engine import analyze_image_local, analyze_meal_images, analyze_text_correction
+from datetime import datetime, timedelta
 import json
+import zlib
 from collections import defaultdict
 from uuid import UUID
 import traceback
 
-async def handle_message(session: Session, user_identifier: str, text: str = None, image_bytes: bytes = None, language: str = "en"):
-    print(f"\n📨 [NEW MSG] User: {user_identifier} | Lang: {language} | Text: {text} | Img: {len(image_bytes) if image_bytes else 0}b")
+# Raw provider payloads are only kept for debugging/auditing
+PROVIDER_ARCHIVE_RETENTION_DAYS = int(os.getenv("PROVIDER_ARCHIVE_RETENTION_DAYS", "90"))
+
+async def handle_message(session: Session, user_identifier: str, text: str = None, images: list = None, language: str = "en"):
+    images = [img for img in (images or []) if img]
+    print(f"\n📨 [NEW MSG] User: {user_identifier} | Lang: {language} | Text: {text} | Img: {len(images)}x {sum(len(img) for img in images)}b")
 
     # 1. User
     user = session.exec(select(User).where(User.identifier == user_identifier)).first()
@@ -21,18 +26,17 @@ async def handle_message(session: Session, user_identifier: str, text: str = Non
         session.commit()
         session.refresh(user)
 
-    # 2. Image
-    img_id = None
-    if image_bytes:
-        new_image = ImageStore(data=image_bytes, mime_type="image/jpeg")
-        session.add(new_image)
-        session.commit()
-        session.refresh(new_image)
-        img_id = new_image.id
+    # 2. Images
+    stored_images = [ImageStore(data=img, mime_type="image/jpeg") for img in images]
+    for new_image in stored_images: session.add(new_image)
+    if stored_images: session.commit()
+    img_ids = [new_image.id for new_image in stored_images]
+    img_id = img_ids[0] if img_ids else None
 
-    # 3. Message Log (User)
+    # 3. Message Log (User) - additional photos of the same meal get their own chat bubble
     user_msg = Message(user_id=user.id, sender="user", text=text, image_id=img_id)
-    session.add(user_msg)
+    user_msgs = [user_msg] + [Message(user_id=user.id, sender="user", image_id=extra_id) for extra_id in img_ids[1:]]
+    for msg in user_msgs: session.add(msg)
     
     active_meal = _get_latest_active_meal(session, user.id)
     ai_result = {}
@@ -41,17 +45,22 @@ async def handle_message(session: Session, user_identifier: str, text: str = Non
     # Metrics
     inference_cost = 0.0
     latency = 0.0
+    metrics = {}
     metadata = {}
 
     # 4. Processing
-    if image_bytes:
+    if images:
         context_str = text if text else "New meal log"
         
-        # Unpack the new dictionary response
-        res = await analyze_image_local(image_bytes, context=context_str, language=language)
+        # Unpack the new dictionary response (one batched call for multi-photo meals)
+        if len(images) == 1:
+            res = await analyze_image_local(images[0], context=context_str, language=language)
+        else:
+            res = await analyze_meal_images(images, context=context_str, language=language)
         ai_result = res["data"]
         inference_cost = res["cost"]
         latency = res["latency"]
+        metrics = res["metrics"]
         metadata = res["metadata"]
 
         print(f"   🤖 AI: {json.dumps(ai_result, indent=2)}")
@@ -71,32 +80,34 @@ async def handle_message(session: Session, user_identifier: str, text: str = Non
             session.commit()
             session.refresh(new_meal)
             
-            _save_log(session, new_meal.id, ai_result)
+            _save_logs(session, new_meal.id, ai_result.get("items") or [ai_result])
             active_meal = new_meal
             bot_reply_text = ai_result.get("reply_text")
             
-            user_msg.meal_id = new_meal.id
-            session.add(user_msg)
+            for msg in user_msgs:
+                msg.meal_id = new_meal.id
+                session.add(msg)
             session.commit()
         else:
             bot_reply_text = ai_result.get("reply_text", "That doesn't look like food.")
             active_meal = None 
         
     elif text and active_meal:
-        last_log = session.exec(select(NutritionLog).where(NutritionLog.meal_id == active_meal.id)).first()
-        current_data = json.loads(last_log.raw_json) if last_log else {}
+        meal_logs = session.exec(_ordered_logs(NutritionLog.meal_id == active_meal.id)).all()
+        current_data = _meal_snapshot(meal_logs)
         
         # Unpack Correction
         res = await analyze_text_correction(current_data, text, language=language)
         ai_result = res["data"]
         inference_cost = res["cost"]
         latency = res["latency"]
+        metrics = res["metrics"]
         metadata = res["metadata"]
 
         print(f"   🤖 Correction: {json.dumps(ai_result, indent=2)}")
         print(f"   💰 Cost: ${inference_cost:.6f} | ⏱️ Latency: {latency:.2f}s")
         
-        _update_log(session, last_log, ai_result)
+        _update_logs(session, active_meal.id, meal_logs, ai_result)
         
         # Accumulate Cost
         active_meal.total_cost += inference_cost
@@ -120,9 +131,11 @@ async def handle_message(session: Session, user_identifier: str, text: str = Non
         text=bot_reply_text,
         cost=inference_cost,
         latency_seconds=latency,
-        provider_response=metadata 
+        **metrics
     )
     session.add(bot_msg)
+    if metadata:
+        _archive_provider_response(session, bot_msg.id, metadata)
     session.commit()
 
     return {
@@ -139,7 +152,10 @@ async def handle_message(session: Session, user_identifier: str, text: str = Non
 def update_meal_nutrition(session: Session, meal_id: str, updates: dict):
     try:
         uuid_obj = UUID(meal_id)
-        log = session.exec(select(NutritionLog).where(NutritionLog.meal_id == uuid_obj)).first()
+        query = _ordered_logs(NutritionLog.meal_id == uuid_obj)
+        # Multi-item meals: 'log_id' picks the item, otherwise the first one is edited
+        if 'log_id' in updates: query = query.where(NutritionLog.id == UUID(updates['log_id']))
+        log = session.exec(query).first()
         if not log:
             return False
         
@@ -176,6 +192,10 @@ def get_user_history_summary(session: Session, user_identifier: str):
     if not user: return []
 
     meals = session.exec(select(Meal).where(Meal.user_id == user.id).order_by(Meal.created_at.desc())).all()
+    logs_by_meal = defaultdict(list)
+    if meals:
+        all_logs = session.exec(_ordered_logs(NutritionLog.meal_id.in_([m.id for m in meals]))).all()
+        for log in all_logs: logs_by_meal[log.meal_id].append(log)
     
     history_map = defaultdict(lambda: {
         "date": "",
@@ -184,35 +204,45 @@ def get_user_history_summary(session: Session, user_identifier: str):
     })
 
     for meal in meals:
-        log = session.exec(select(NutritionLog).where(NutritionLog.meal_id == meal.id)).first()
-        if not log: continue
+        logs = logs_by_meal.get(meal.id)
+        if not logs: continue
+        log = logs[0]
 
         date_key = meal.created_at.strftime("%Y-%m-%d")
         day_entry = history_map[date_key]
         day_entry["date"] = date_key
         
-        day_entry["totals"]["calories"] += log.calories_kcal
-        day_entry["totals"]["protein"] += log.protein_g
-        day_entry["totals"]["carbs"] += log.carbs_g
-        day_entry["totals"]["fat"] += log.fat_g
-        day_entry["totals"]["fiber"] += log.fiber_g 
+        calories = sum(l.calories_kcal for l in logs)
+        macros = {
+            "protein": sum(l.protein_g for l in logs),
+            "carbs": sum(l.carbs_g for l in logs),
+            "fat": sum(l.fat_g for l in logs),
+            "fiber": sum(l.fiber_g for l in logs)
+        }
+        day_entry["totals"]["calories"] += calories
+        day_entry["totals"]["protein"] += macros["protein"]
+        day_entry["totals"]["carbs"] += macros["carbs"]
+        day_entry["totals"]["fat"] += macros["fat"]
+        day_entry["totals"]["fiber"] += macros["fiber"]
         
         img_url = f"/api/image/{str(meal.image_id)}" if meal.image_id else None
 
+        # UUIDs/datetimes stay native, FastJSONResponse serializes them directly
         day_entry["meals"].append({
-            "id": str(meal.id),
+            "id": meal.id,
             "time": meal.created_at.strftime("%H:%M"),
             "friendly_id": meal.friendly_id,
-            "name": log.item_name,
-            "calories": log.calories_kcal,
+            "name": ", ".join(l.item_name for l in logs),
+            "calories": calories,
             "image_url": img_url,
-            "macros": {
-                "protein": log.protein_g,
-                "carbs": log.carbs_g,
-                "fat": log.fat_g,
-                "fiber": log.fiber_g
-            },
-            "edited": log.edited,
+            "macros": macros,
+            "items": [{
+                "id": l.id,
+                "name": l.item_name,
+                "calories": l.calories_kcal,
+                "macros": {"protein": l.protein_g, "carbs": l.carbs_g, "fat": l.fat_g, "fiber": l.fiber_g}
+            } for l in logs],
+            "edited": any(l.edited for l in logs),
             "user_rating": log.user_rating,
             "user_feedback_text": log.user_feedback_text
         })
@@ -230,6 +260,7 @@ def delete_meal(session: Session, meal_id: str):
         logs = session.exec(select(NutritionLog).where(NutritionLog.meal_id == uuid_obj)).all()
         for log in logs: session.delete(log)
         msgs = session.exec(select(Message).where(Message.meal_id == uuid_obj)).all()
+        _delete_provider_archives(session, [m.id for m in msgs])
         for m in msgs: session.delete(m)
         session.delete(meal)
         session.commit()
@@ -242,10 +273,17 @@ def get_chat_history(session: Session, user_identifier: str):
     user = session.exec(select(User).where(User.identifier == user_identifier)).first()
     if not user: return []
     
+    # Scalar subquery instead of a join so multi-item meals don't duplicate messages
+    rating = (
+        select(NutritionLog.user_rating)
+        .where(NutritionLog.meal_id == Meal.id)
+        .order_by(NutritionLog.position, NutritionLog.id)
+        .limit(1)
+        .scalar_subquery()
+    )
     results = session.exec(
-        select(Message, Meal.friendly_id, Meal.id, NutritionLog.user_rating)
+        select(Message, Meal.friendly_id, Meal.id, rating)
         .outerjoin(Meal, Message.meal_id == Meal.id)
-        .outerjoin(NutritionLog, Meal.id == NutritionLog.meal_id)
         .where(Message.user_id == user.id)
         .order_by(Message.timestamp)
     ).all()
@@ -254,13 +292,13 @@ def get_chat_history(session: Session, user_identifier: str):
     for msg, friendly_id, meal_id, user_rating in results:
         img_url = f"/api/image/{str(msg.image_id)}" if msg.image_id else None
         chat_data.append({
-            "id": str(msg.id),
+            "id": msg.id,
             "sender": msg.sender,
             "text": msg.text,
             "imageUrl": img_url,
             "timestamp": msg.timestamp,
             "mealLabel": friendly_id,
-            "mealId": str(meal_id) if meal_id else None,
+            "mealId": meal_id,
             "userRating": user_rating
         })
     return chat_data
@@ -272,6 +310,7 @@ def reset_user(session: Session, user_identifier: str):
             return False
         print(f"🗑️ Deleting user {user.id}")
         messages = session.exec(select(Message).where(Message.user_id == user.id)).all()
+        _delete_provider_archives(session, [msg.id for msg in messages])
         for msg in messages: session.delete(msg)
         meals = session.exec(select(Meal).where(Meal.user_id == user.id)).all()
         for meal in meals:
@@ -286,6 +325,27 @@ def reset_user(session: Session, user_identifier: str):
         session.rollback()
         return False
 
+def purge_provider_archive(session: Session, retention_days: int = PROVIDER_ARCHIVE_RETENTION_DAYS):
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    result = session.execute(delete(ProviderResponseArchive).where(ProviderResponseArchive.created_at < cutoff))
+    session.commit()
+    if result.rowcount:
+        print(f"🧹 Purged {result.rowcount} provider responses older than {retention_days} days")
+    return result.rowcount
+
+def load_provider_response(session: Session, message_id: UUID):
+    entry = session.exec(select(ProviderResponseArchive).where(ProviderResponseArchive.message_id == message_id)).first()
+    if not entry: return None
+    return json.loads(zlib.decompress(entry.payload))
+
+def _archive_provider_response(session, message_id, payload):
+    blob = zlib.compress(json.dumps(payload, default=str).encode("utf-8"))
+    session.add(ProviderResponseArchive(message_id=message_id, payload=blob))
+
+def _delete_provider_archives(session, message_ids):
+    if not message_ids: return
+    session.execute(delete(ProviderResponseArchive).where(ProviderResponseArchive.message_id.in_(message_ids)))
+
 def _get_latest_active_meal(session, user_id):
     return session.exec(select(Meal).where(Meal.user_id == user_id).order_by(Meal.created_at.desc())).first()
 
@@ -299,17 +359,77 @@ def _generate_friendly_id(session, user_id, meal_type):
     if not existing_meals: return base_id
     return f"{base_id}-{len(existing_meals) + 1}"
 
-def _save_log(session, meal_id, data):
-    log = NutritionLog(meal_id=meal_id)
-    _map_data_to_log(log, data)
-    session.add(log)
+def _ordered_logs(condition):
+    # Stable item order: every "first log of the meal" lookup must agree
+    return select(NutritionLog).where(condition).order_by(NutritionLog.position, NutritionLog.id)
+
+def _save_logs(session, meal_id, items):
+    for position, data in enumerate(items):
+        log = NutritionLog(meal_id=meal_id, position=position)
+        _map_data_to_log(log, data)
+        session.add(log)
     session.commit()
 
-def _update_log(session, log, data):
-    _map_data_to_log(log, data)
-    session.add(log)
+def _update_logs(session, meal_id, logs, data):
+    items = data.get("items")
+    if not items or len(logs) <= 1 and len(items) <= 1:
+        if logs:
+            _map_data_to_log(logs[0], data)
+            session.add(logs[0])
+        # A meal-level answer for a multi-item meal replaces all items, so the
+        # meal is collapsed into one log instead of double counting the rest
+        for log in logs[1:]:
+            session.delete(log)
+        session.commit()
+        return
+
+    # Multi-item correction: match items to logs by the echoed log_id, then by name,
+    # so ratings/feedback stay on the same food even if the model reorders items
+    remaining = {str(log.id): log for log in logs}
+    unmatched = []
+    for item in items:
+        log = remaining.pop(str(item.get("log_id")), None)
+        if log:
+            _map_data_to_log(log, item)
+            session.add(log)
+        else:
+            unmatched.append(item)
+
+    next_position = max(log.position for log in logs) + 1 if logs else 0
+    for item in unmatched:
+        name = str(item.get("item_name", "")).strip().lower()
+        log = next((l for l in remaining.values() if l.item_name.strip().lower() == name), None)
+        if log:
+            del remaining[str(log.id)]
+        else:
+            log = NutritionLog(meal_id=meal_id, position=next_position)
+            next_position += 1
+        _map_data_to_log(log, item)
+        session.add(log)
+
+    # Whatever is left was removed by the correction
+    for log in remaining.values():
+        session.delete(log)
     session.commit()
 
+def _meal_snapshot(logs):
+    if not logs: return {}
+    if len(logs) == 1: return {**json.loads(logs[0].raw_json), "log_id": str(logs[0].id)}
+    items = [{**json.loads(log.raw_json), "log_id": str(log.id)} for log in logs]
+    return {
+        "is_food": True,
+        "meal_type": logs[0].meal_type,
+        "item_name": ", ".join(log.item_name for log in logs),
+        "items": items,
+        "total": {
+            "calories_kcal": sum(log.calories_kcal for log in logs),
+            "protein_g": sum(log.protein_g for log in logs),
+            "carbs_g": sum(log.carbs_g for log in logs),
+            "fat_g": sum(log.fat_g for log in logs),
+            "fiber_g": sum(log.fiber_g for log in logs)
+        }
+    }
+
 def _map_data_to_log(log, data):
     nutri = data.get("nutrition", {})
     log.item_name = data.get("item_name", "Unknown")
@@ -324,4 +444,4 @@ def _map_data_to_log(log, data):
     log.confidence_score = data.get("confidence_score", 0.0)
     log.reasoning = data.get("reasoning", "")
     log.dietary_flags = data.get("dietary_flags", [])
-    log.raw_json = json.dumps(data)
\ No newline at end of file
+    log.raw_json = json.dumps({k: v for k, v in data.items() if k != "log_id"})
\ No newline at end of file
@@ -0,0 +1,220 @@
+# app/portability.py
+# Bulk export/import of a user's nutrition history (NDJSON or CSV).
+import csv
+import io
+import json
+import math
+import orjson
+from datetime import datetime
+from uuid import UUID, uuid4
+from sqlalchemy import insert
+from sqlmodel import Session, select
+from .database import engine
+from .models import User, Meal, NutritionLog
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Rows fetched per round trip from the server-side cursor / inserted per batch on import
+EXPORT_CHUNK_SIZE = 1000
+IMPORT_BATCH_SIZE = 1000
+
+MEAL_FIELDS = ["meal_id", "friendly_id", "status", "created_at", "total_cost"]
+LOG_FIELDS = [
+    "position", "item_name", "meal_type", "is_composed_meal", "estimated_weight_g",
+    "calories_kcal", "protein_g", "carbs_g", "fat_g", "fiber_g",
+    "edited", "user_rating", "user_feedback_text", "original_nutrition_snapshot",
+    "confidence_score", "reasoning", "dietary_flags", "raw_json",
+]
+EXPORT_FIELDS = MEAL_FIELDS + ["image_url"] + LOG_FIELDS
+
+INT_FIELDS = {"position", "estimated_weight_g", "calories_kcal", "protein_g", "carbs_g", "fat_g", "fiber_g"}
+FLOAT_FIELDS = {"total_cost", "confidence_score"}
+BOOL_FIELDS = {"is_composed_meal", "edited"}
+STR_FIELDS = {
+    "meal_id", "friendly_id", "status", "item_name", "meal_type", "user_rating",
+    "user_feedback_text", "original_nutrition_snapshot", "reasoning", "raw_json",
+}
+# nutrition_log integer columns are 32-bit
+INT_RANGE = (-2**31, 2**31 - 1)
+
+def find_user(session: Session, user_identifier: str):
+    return session.exec(select(User).where(User.identifier == user_identifier)).first()
+
+def stream_user_export(user_id: UUID, fmt: str = "ndjson", include_images: bool = False):
+    """
+    Yields the export in chunks. Uses its own session so it outlives the request
+    dependency, and a server-side cursor (yield_per) so memory stays flat.
+    """
+    query = (
+        select(
+            Meal.id, Meal.friendly_id, Meal.status, Meal.created_at, Meal.total_cost, Meal.image_id,
+            *[getattr(NutritionLog, field) for field in LOG_FIELDS]
+        )
+        .join(NutritionLog, NutritionLog.meal_id == Meal.id)
+        .where(Meal.user_id == user_id)
+        .order_by(Meal.created_at, Meal.id, NutritionLog.position, NutritionLog.id)
+        .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    )
+
+    buffer = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+
+    with Session(engine) as session:
+        for partition in session.execute(query).partitions():
+            for row in partition:
+                record = _export_record(row, include_images)
+                if writer:
+                    record["dietary_flags"] = json.dumps(record["dietary_flags"])
+                    writer.writerow(record)
+                else:
+                    buffer.write(orjson.dumps(record).decode("utf-8"))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def import_user_history(session: Session, user_identifier: str, stream, fmt: str = "ndjson"):
+    """
+    Imports an export file in batches. Meals get fresh IDs so re-importing into the
+    same database doesn't collide; images are not transferred.
+    """
+    user = find_user(session, user_identifier)
+    if not user:
+        # Flushed, not committed: a rejected file must not leave an empty user behind
+        user = User(identifier=user_identifier)
+        session.add(user)
+        session.flush()
+
+    text_stream = io.TextIOWrapper(stream, encoding="utf-8")
+    if fmt == "csv":
+        rows = csv.DictReader(text_stream)
+    else:
+        rows = (json.loads(line) for line in text_stream if line.strip())
+
+    meal_ids = {}
+    next_position = {}
+    meal_batch, log_batch = [], []
+    meal_count = log_count = 0
+
+    for row in rows:
+        row = _coerce_row(row)
+        source_id = row["meal_id"]
+        if source_id not in meal_ids:
+            meal_ids[source_id] = uuid4()
+            meal_batch.append({
+                "id": meal_ids[source_id],
+                "user_id": user.id,
+                "friendly_id": row["friendly_id"],
+                "status": row.get("status") or "draft",
+                "created_at": row.get("created_at") or datetime.utcnow(),
+                "total_cost": row.get("total_cost") or 0.0,
+                "image_id": None,
+            })
+
+        log = {field: row.get(field) for field in LOG_FIELDS}
+        log["id"] = uuid4()
+        log["meal_id"] = meal_ids[source_id]
+        # Exports predating the position column keep their file order
+        if log["position"] is None: log["position"] = next_position.get(source_id, 0)
+        next_position[source_id] = log["position"] + 1
+        log["dietary_flags"] = log["dietary_flags"] or []
+        log["raw_json"] = log["raw_json"] or "{}"
+        log_batch.append(_with_log_defaults(log))
+
+        if len(log_batch) >= IMPORT_BATCH_SIZE:
+            meal_count += len(meal_batch)
+            log_count += len(log_batch)
+            _flush_batch(session, meal_batch, log_batch)
+            meal_batch, log_batch = [], []
+
+    meal_count += len(meal_batch)
+    log_count += len(log_batch)
+    _flush_batch(session, meal_batch, log_batch)
+    session.commit()
+    text_stream.detach()
+
+    print(f"📥 Imported {meal_count} meals / {log_count} logs for {user_identifier}")
+    return {"meals": meal_count, "logs": log_count}
+
+def _flush_batch(session, meal_batch, log_batch):
+    # Core executemany: psycopg2 batches these into multi-row INSERTs
+    if meal_batch: session.execute(insert(Meal.__table__), meal_batch)
+    if log_batch: session.execute(insert(NutritionLog.__table__), log_batch)
+
+def _export_record(row, include_images):
+    record = {
+        "meal_id": str(row.id),
+        "friendly_id": row.friendly_id,
+        "status": row.status,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "total_cost": row.total_cost,
+        "image_url": f"/api/image/{str(row.image_id)}" if include_images and row.image_id else None,
+    }
+    for field in LOG_FIELDS:
+        record[field] = getattr(row, field)
+    return record
+
+def _with_log_defaults(log):
+    for field in INT_FIELDS:
+        if log.get(field) is None: log[field] = 0
+    for field in BOOL_FIELDS:
+        if log.get(field) is None: log[field] = False
+    if log.get("confidence_score") is None: log["confidence_score"] = 0.0
+    if log.get("meal_type") is None: log["meal_type"] = "snack"
+    if log.get("item_name") is None: log["item_name"] = "Unknown"
+    return log
+
+def _coerce_row(row: dict):
+    """
+    CSV gives us strings only; NDJSON values must already have the column's type.
+    Anything else raises ValueError so a bad file is a 400, not a database error.
+    """
+    if not isinstance(row, dict):
+        raise ValueError(f"Expected an object per row, got {type(row).__name__}")
+    clean = {}
+    for key, value in row.items():
+        if value == "":
+            value = None
+        if value is not None:
+            value = _coerce_value(key, value)
+        clean[key] = value
+    if clean.get("meal_id") is None:
+        raise ValueError("Row without meal_id")
+    if clean.get("friendly_id") is None:
+        raise ValueError("Row without friendly_id")
+    return clean
+
+def _coerce_value(key, value):
+    if key in INT_FIELDS:
+        if isinstance(value, str): value = float(value)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(f"'{key}' must be a number, got {value!r}")
+        value = int(value)
+        if not INT_RANGE[0] <= value <= INT_RANGE[1]:
+            raise ValueError(f"'{key}' out of range: {value}")
+    elif key in FLOAT_FIELDS:
+        if isinstance(value, str): value = float(value)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(f"'{key}' must be a number, got {value!r}")
+        value = float(value)
+    elif key in BOOL_FIELDS:
+        if isinstance(value, str): value = value.lower() in ("true", "1", "yes")
+        if not isinstance(value, bool):
+            raise ValueError(f"'{key}' must be a boolean, got {value!r}")
+    elif key == "dietary_flags":
+        if isinstance(value, str): value = json.loads(value)
+        if not isinstance(value, list) or not all(isinstance(flag, str) for flag in value):
+            raise ValueError(f"'dietary_flags' must be a list of strings, got {value!r}")
+    elif key == "created_at":
+        if not isinstance(value, str):
+            raise ValueError(f"'created_at' must be an ISO 8601 string, got {value!r}")
+        value = datetime.fromisoformat(value)
+    elif key in STR_FIELDS and not isinstance(value, str):
+        raise ValueError(f"'{key}' must be a string, got {value!r}")
+    return value
@@ -0,0 +1,12 @@
+# app/responses.py
+from typing import Any
+import orjson
+from fastapi.responses import JSONResponse
+
+class FastJSONResponse(JSONResponse):
+    """
+    orjson-backed JSON response. Serializes UUID and datetime natively, so payloads
+    can be returned as-is without a jsonable_encoder pass.
+    """
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,54 @@
+# app/schemas.py
+# Response shapes for the read-heavy endpoints. Used for the OpenAPI schema only:
+# the endpoints return FastJSONResponse directly, so FastAPI skips re-validation.
+from typing import Optional, List
+from datetime import datetime
+from uuid import UUID
+from sqlmodel import SQLModel
+
+class MacrosOut(SQLModel):
+    protein: int
+    carbs: int
+    fat: int
+    fiber: int
+
+class MealItemOut(SQLModel):
+    id: UUID
+    name: str
+    calories: int
+    macros: MacrosOut
+
+class MealSummaryOut(SQLModel):
+    id: UUID
+    time: str
+    friendly_id: str
+    name: str
+    calories: int
+    image_url: Optional[str] = None
+    macros: MacrosOut
+    items: List[MealItemOut]
+    edited: bool
+    user_rating: Optional[str] = None
+    user_feedback_text: Optional[str] = None
+
+class DayTotalsOut(SQLModel):
+    calories: int
+    protein: int
+    carbs: int
+    fat: int
+    fiber: int
+
+class HistoryDayOut(SQLModel):
+    date: str
+    totals: DayTotalsOut
+    meals: List[MealSummaryOut]
+
+class ChatMessageOut(SQLModel):
+    id: UUID
+    sender: str
+    text: Optional[str] = None
+    imageUrl: Optional[str] = None
+    timestamp: datetime
+    mealLabel: Optional[str] = None
+    mealId: Optional[UUID] = None
+    userRating: Optional[str] = None
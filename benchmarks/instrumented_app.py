@@ -0,0 +1,71 @@
+# benchmarks/instrumented_app.py
+# Wraps app.main:app with per-operation SQL query counting and a stats endpoint.
+# The load test tags each request with X-Bench-Op so routes shared by several
+# operations (POST /api/chat) are counted separately.
+import resource
+import threading
+from collections import defaultdict
+from contextvars import ContextVar
+from fastapi import Request
+from sqlalchemy import event
+
+from app.database import engine
+from app.main import app
+
+_current = ContextVar("bench_query_counter", default=None)
+_lock = threading.Lock()
+_stats = defaultdict(lambda: {"requests": 0, "queries": 0})
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _current.get()
+    if counter is not None:
+        counter[0] += 1
+
+@app.middleware("http")
+async def count_queries(request: Request, call_next):
+    if request.url.path.startswith("/__bench__"):
+        return await call_next(request)
+
+    # A mutable cell survives the copy of the context into the threadpool
+    counter = [0]
+    token = _current.set(counter)
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(token)
+
+    key = request.headers.get("x-bench-op")
+    if not key:
+        route = request.scope.get("route")
+        key = f"{request.method} {route.path if route else request.url.path}"
+    with _lock:
+        _stats[key]["requests"] += 1
+        _stats[key]["queries"] += counter[0]
+    return response
+
+@app.get("/__bench__/stats")
+def bench_stats():
+    with _lock:
+        endpoints = {
+            key: {**value, "queries_per_request": value["queries"] / value["requests"]}
+            for key, value in _stats.items() if value["requests"]
+        }
+    return {"endpoints": endpoints, "rss_mb": _rss_mb()}
+
+@app.post("/__bench__/reset")
+def bench_reset():
+    with _lock:
+        _stats.clear()
+    return {"status": "reset", "rss_mb": _rss_mb()}
+
+def _rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Fallback without procfs: peak over the process lifetime (KiB on Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
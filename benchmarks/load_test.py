@@ -0,0 +1,356 @@
+# benchmarks/load_test.py
+# Boots app.main:app (instrumented) against a local database and the stub
+# completion server, drives a mixed workload at rising concurrency and writes
+# a JSON report (median of --trials per level, after a warm-up). With --baseline
+# it fails on regressions beyond --threshold and --abs-tolerance-ms.
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import httpx
+from sqlmodel import SQLModel, create_engine
+
+from app import models  # noqa: F401  (registers the tables on SQLModel.metadata)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PICTURES_DIR = os.path.join(ROOT, "pictures")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+API_KEY = "bench"
+
+# Relative weights of the traffic mix
+DEFAULT_MIX = {
+    "image_chat": 10,
+    "multi_image_chat": 3,
+    "text_correction": 15,
+    "history": 30,
+    "chat_history": 30,
+    "image_fetch": 12,
+}
+
+def percentile(values, pct):
+    if not values: return 0.0
+    ordered = sorted(values)
+    # Nearest-rank percentile
+    idx = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def load_pictures():
+    files = sorted(f for f in os.listdir(PICTURES_DIR) if f.lower().endswith((".jpg", ".jpeg", ".png", ".webp")))
+    pictures = []
+    for name in files:
+        with open(os.path.join(PICTURES_DIR, name), "rb") as f:
+            pictures.append((name, f.read()))
+    return pictures
+
+class Workload:
+    def __init__(self, client, users, pictures, mix):
+        self.client = client
+        self.users = users
+        self.pictures = pictures
+        self.ops = list(mix.keys())
+        self.weights = list(mix.values())
+        self.image_urls = defaultdict(list)
+
+    async def seed(self):
+        for user in self.users:
+            await self.image_chat(user)
+            await self.refresh_images(user)
+
+    async def refresh_images(self, user):
+        r = await self.client.get(f"/api/chat/{user}")
+        r.raise_for_status()
+        self.image_urls[user] = [m["imageUrl"] for m in r.json() if m.get("imageUrl")]
+
+    async def run_one(self):
+        op = random.choices(self.ops, weights=self.weights)[0]
+        user = random.choice(self.users)
+        start = time.perf_counter()
+        try:
+            # Tag the request so the server attributes its queries to this op, not the route
+            r = await getattr(self, op)(user, {"X-Bench-Op": op})
+            ok = r.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        return op, time.perf_counter() - start, ok
+
+    async def image_chat(self, user, headers=None):
+        name, data = random.choice(self.pictures)
+        return await self.client.post("/api/chat", data={"user_id": user}, files={"image": (name, data, "image/jpeg")}, headers=headers)
+
+    async def multi_image_chat(self, user, headers=None):
+        picks = random.sample(self.pictures, k=min(2, len(self.pictures)))
+        files = [("images", (name, data, "image/jpeg")) for name, data in picks]
+        return await self.client.post("/api/chat", data={"user_id": user}, files=files, headers=headers)
+
+    async def text_correction(self, user, headers=None):
+        return await self.client.post("/api/chat", data={"user_id": user, "text": "Add a side salad please"}, headers=headers)
+
+    async def history(self, user, headers=None):
+        return await self.client.get(f"/api/history/{user}", headers=headers)
+
+    async def chat_history(self, user, headers=None):
+        return await self.client.get(f"/api/chat/{user}", headers=headers)
+
+    async def image_fetch(self, user, headers=None):
+        urls = self.image_urls.get(user)
+        if not urls:
+            return await self.chat_history(user, headers)
+        return await self.client.get(random.choice(urls), headers=headers)
+
+async def run_trial(workload, concurrency, duration):
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            op, elapsed, ok = await workload.run_one()
+            samples[op].append(elapsed)
+            if not ok: errors[op] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return samples, errors, time.perf_counter() - started
+
+async def run_level(workload, concurrency, duration, trials=1):
+    # Median across trials so a single noisy trial can't move the numbers on its own
+    runs = [await run_trial(workload, concurrency, duration) for _ in range(trials)]
+    ops = sorted({op for samples, _, _ in runs for op in samples})
+
+    endpoints = {}
+    for op in ops:
+        per_trial = [samples[op] for samples, _, _ in runs if samples.get(op)]
+        endpoints[op] = {
+            "count": sum(len(values) for values in per_trial),
+            "errors": sum(errors.get(op, 0) for _, errors, _ in runs),
+            "p50_ms": statistics.median(percentile(values, 50) for values in per_trial) * 1000,
+            "p95_ms": statistics.median(percentile(values, 95) for values in per_trial) * 1000,
+            "p99_ms": statistics.median(percentile(values, 99) for values in per_trial) * 1000,
+        }
+    throughput = statistics.median(sum(len(v) for v in samples.values()) / wall for samples, _, wall in runs)
+    return {
+        "concurrency": concurrency,
+        "trials": trials,
+        "requests": sum(stats["count"] for stats in endpoints.values()),
+        "throughput_rps": throughput,
+        "endpoints": endpoints,
+    }
+
+async def wait_until_up(url, timeout=30.0):
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.time() < deadline:
+            try:
+                await client.get(url, timeout=1.0)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not come up")
+
+def reset_database(url):
+    # Every run starts empty (the app recreates the schema on startup), so the seed
+    # phase produces the same data and leftovers such as orphaned images can't skew it
+    engine = create_engine(url)
+    SQLModel.metadata.drop_all(engine)
+    engine.dispose()
+
+def start_servers(args):
+    stub_port, app_port = free_port(), free_port()
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stub_openai", "--port", str(stub_port),
+         "--latency", str(args.stub_latency), "--jitter", str(args.stub_jitter), "--seed", str(args.seed)],
+        cwd=ROOT
+    )
+    env = dict(
+        os.environ,
+        DATABASE_URL=args.database_url,
+        OPENROUTER_BASE_URL=f"http://127.0.0.1:{stub_port}",
+        OPENROUTER_API_KEY="bench",
+        API_KEY=API_KEY,
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.instrumented_app:app",
+         "--host", "127.0.0.1", "--port", str(app_port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL if not args.verbose else None
+    )
+    return stub, server, stub_port, app_port
+
+async def run(args):
+    pictures = load_pictures()
+    mix = dict(DEFAULT_MIX)
+    if args.mix:
+        mix.update(json.loads(args.mix))
+    levels = [int(c) for c in args.concurrency.split(",")]
+    users = [f"bench-user-{i}" for i in range(args.users)]
+
+    reset_database(args.database_url)
+    stub, server, stub_port, app_port = start_servers(args)
+    base_url = f"http://127.0.0.1:{app_port}"
+    try:
+        await wait_until_up(f"http://127.0.0.1:{stub_port}")
+        await wait_until_up(f"{base_url}/__bench__/stats")
+
+        limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+        async with httpx.AsyncClient(base_url=base_url, headers={"X-API-Key": API_KEY},
+                                     timeout=60.0, limits=limits) as client:
+            workload = Workload(client, users, pictures, mix)
+            print(f"🌱 Seeding {len(users)} users...")
+            await workload.seed()
+
+            results = []
+            for concurrency in levels:
+                # Warm connections, pools and caches at this concurrency; not measured
+                if args.warmup:
+                    await run_trial(workload, concurrency, args.warmup)
+                rss_before = (await client.post("/__bench__/reset")).json()["rss_mb"]
+                level = await run_level(workload, concurrency, args.duration, args.trials)
+                stats = (await client.get("/__bench__/stats")).json()
+                level["db_queries"] = {k: v["queries_per_request"] for k, v in stats["endpoints"].items()}
+                level["rss_mb"] = stats["rss_mb"]
+                level["rss_delta_mb"] = stats["rss_mb"] - rss_before
+                results.append(level)
+                _print_level(level)
+                for user in users:
+                    await workload.refresh_images(user)
+    finally:
+        for proc in (server, stub):
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "database_url": args.database_url.split("@")[-1],
+            "stub_latency": args.stub_latency,
+            "duration": args.duration,
+            "trials": args.trials,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "users": args.users,
+            "mix": mix,
+        },
+        "levels": results,
+    }
+
+def _print_level(level):
+    print(f"\n⚡ concurrency={level['concurrency']} x{level['trials']} | {level['throughput_rps']:.1f} req/s | RSS {level['rss_mb']:.0f} MB ({level['rss_delta_mb']:+.1f})")
+    for op, s in level["endpoints"].items():
+        print(f"   {op:<18} n={s['count']:<5} err={s['errors']:<3} "
+              f"p50={s['p50_ms']:>7.1f}ms p95={s['p95_ms']:>7.1f}ms p99={s['p99_ms']:>7.1f}ms")
+    for op, q in sorted(level["db_queries"].items()):
+        print(f"   🗄️  {op:<18} {q:.1f} queries/req")
+
+def compare(current, baseline, threshold, abs_tolerance_ms=25.0, min_samples=20):
+    """
+    Returns (regressions, skipped). A latency regression must exceed both the relative
+    threshold and abs_tolerance_ms; ops with fewer than min_samples requests on either
+    side are too noisy for percentiles and are only reported as skipped.
+    """
+    regressions = []
+    skipped = []
+    base_levels = {lvl["concurrency"]: lvl for lvl in baseline["levels"]}
+    for level in current["levels"]:
+        base = base_levels.get(level["concurrency"])
+        if not base: continue
+        c = level["concurrency"]
+
+        if level["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(f"c={c} throughput {base['throughput_rps']:.1f} -> {level['throughput_rps']:.1f} req/s")
+
+        for op, stats in level["endpoints"].items():
+            base_op = base["endpoints"].get(op)
+            if not base_op: continue
+            if stats["errors"] > base_op["errors"]:
+                regressions.append(f"c={c} {op} errors {base_op['errors']} -> {stats['errors']}")
+            if min(stats["count"], base_op["count"]) < min_samples:
+                skipped.append(f"c={c} {op} (n={stats['count']}, baseline n={base_op['count']})")
+                continue
+            for key in ("p95_ms", "p99_ms"):
+                if stats[key] > base_op[key] * (1 + threshold) and stats[key] - base_op[key] > abs_tolerance_ms:
+                    regressions.append(f"c={c} {op} {key} {base_op[key]:.1f} -> {stats[key]:.1f}")
+
+        # Fresh database + the stub echoing corrections back keep queries/op stable,
+        # so growth of more than half a query per request is a regression
+        for op, queries in level["db_queries"].items():
+            base_q = base["db_queries"].get(op)
+            if base_q is not None and queries > base_q + 0.5:
+                regressions.append(f"c={c} {op} queries/req {base_q:.1f} -> {queries:.1f}")
+
+        # Memory growth during this level, allowing threshold x the baseline RSS as noise
+        allowed = max(base["rss_delta_mb"], 0.0) + base["rss_mb"] * threshold
+        if level["rss_delta_mb"] > allowed:
+            regressions.append(f"c={c} RSS growth {base['rss_delta_mb']:+.1f} -> {level['rss_delta_mb']:+.1f} MB")
+    return regressions, skipped
+
+def main():
+    parser = argparse.ArgumentParser(description="Snap-2-Track API load test")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL", f"sqlite:///{os.path.join(ROOT, '.bench.db')}"),
+                        help="Scratch database; all tables are dropped at the start of each run")
+    parser.add_argument("--concurrency", default="1,4,16,32", help="Comma separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per trial")
+    parser.add_argument("--trials", type=int, default=3, help="Trials per level; the report keeps the median")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds before each level (0 to skip)")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--stub-latency", type=float, default=0.3)
+    parser.add_argument("--stub-jitter", type=float, default=0.1)
+    parser.add_argument("--mix", help='JSON weight overrides, e.g. \'{"history": 50}\'')
+    parser.add_argument("--output", help="Report path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Also write the report to {DEFAULT_BASELINE}")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression (0.2 = 20%%)")
+    parser.add_argument("--abs-tolerance-ms", type=float, default=25.0, help="Latency growth below this is never a regression")
+    parser.add_argument("--min-samples", type=int, default=20, help="Skip latency checks for ops with fewer requests")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    report = asyncio.run(run(args))
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.utcnow():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Report written to {output}")
+
+    if args.save_baseline:
+        with open(DEFAULT_BASELINE, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📌 Baseline updated: {DEFAULT_BASELINE}")
+
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            print(f"⚠️  Baseline {args.baseline} not found, record one with 'make bench-baseline'.")
+            sys.exit(1)
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions, skipped = compare(report, baseline, args.threshold, args.abs_tolerance_ms, args.min_samples)
+        if skipped:
+            print(f"\n⚠️  Latency not compared, fewer than {args.min_samples} samples:")
+            for line in skipped:
+                print(f"   - {line}")
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"   - {line}")
+            sys.exit(1)
+        print(f"\n✅ No regressions beyond {args.threshold:.0%} vs {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# benchmarks/serialization_bench.py
+# Compares the default FastAPI JSON path (jsonable_encoder + json.dumps) with
+# FastJSONResponse (orjson) on large synthetic history/chat payloads, and reports
+# gzip/brotli sizes and compression time.
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.compression import brotli
+from app.responses import FastJSONResponse
+
+def build_history(days: int, meals_per_day: int):
+    start = datetime(2022, 1, 1)
+    history = []
+    for d in range(days):
+        day = start + timedelta(days=d)
+        meals = []
+        for m in range(meals_per_day):
+            items = [{
+                "id": uuid4(),
+                "name": f"Item {i}",
+                "calories": random.randint(50, 600),
+                "macros": {"protein": 20, "carbs": 40, "fat": 10, "fiber": 4}
+            } for i in range(random.randint(1, 3))]
+            meals.append({
+                "id": uuid4(),
+                "time": f"{8 + m * 4:02d}:30",
+                "friendly_id": f"{day:%b-%d}-lunch".lower(),
+                "name": ", ".join(item["name"] for item in items),
+                "calories": sum(item["calories"] for item in items),
+                "image_url": f"/api/image/{uuid4()}",
+                "macros": {"protein": 20, "carbs": 40, "fat": 10, "fiber": 4},
+                "items": items,
+                "edited": False,
+                "user_rating": None,
+                "user_feedback_text": None
+            })
+        history.append({
+            "date": f"{day:%Y-%m-%d}",
+            "totals": {"calories": 2000, "protein": 90, "carbs": 250, "fat": 70, "fiber": 25},
+            "meals": meals
+        })
+    return history
+
+def build_chat(messages: int):
+    start = datetime(2022, 1, 1)
+    return [{
+        "id": uuid4(),
+        "sender": "user" if i % 2 == 0 else "bot",
+        "text": None if i % 2 == 0 else "That golden crust looks perfectly baked, about 600 kcal with 30g protein.",
+        "imageUrl": f"/api/image/{uuid4()}" if i % 2 == 0 else None,
+        "timestamp": start + timedelta(minutes=i * 7),
+        "mealLabel": "jan-01-lunch",
+        "mealId": uuid4(),
+        "userRating": None
+    } for i in range(messages)]
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def bench_payload(name, payload, repeat):
+    # What FastAPI does for a plain return value with the default JSONResponse
+    default_s, default_body = timed(lambda: JSONResponse(jsonable_encoder(payload)).body, repeat)
+    fast_s, fast_body = timed(lambda: FastJSONResponse(payload).body, repeat)
+    assert json.loads(default_body) == json.loads(fast_body), "serializers disagree"
+
+    row = {
+        "payload": name,
+        "bytes": len(fast_body),
+        "default_ms": default_s * 1000,
+        "orjson_ms": fast_s * 1000,
+        "speedup": default_s / fast_s if fast_s else 0.0,
+    }
+    gzip_s, gz = timed(lambda: gzip.compress(fast_body, compresslevel=6), repeat)
+    row.update({"gzip_bytes": len(gz), "gzip_ms": gzip_s * 1000})
+    if brotli is not None:
+        br_s, br = timed(lambda: brotli.compress(fast_body, quality=4), repeat)
+        row.update({"br_bytes": len(br), "br_ms": br_s * 1000})
+    return row
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON serialization/compression benchmark")
+    parser.add_argument("--days", type=int, default=1095, help="Days of history (default ~3 years)")
+    parser.add_argument("--meals-per-day", type=int, default=3)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Optional JSON report path")
+    args = parser.parse_args()
+
+    random.seed(42)
+    rows = [
+        bench_payload(f"history ({args.days} days)", build_history(args.days, args.meals_per_day), args.repeat),
+        bench_payload(f"chat ({args.messages} msgs)", build_chat(args.messages), args.repeat),
+    ]
+
+    for row in rows:
+        print(f"📦 {row['payload']}: {row['bytes'] / 1024:.0f} kB")
+        print(f"   default  {row['default_ms']:>8.1f} ms")
+        print(f"   orjson   {row['orjson_ms']:>8.1f} ms  ({row['speedup']:.1f}x)")
+        print(f"   gzip     {row['gzip_bytes'] / 1024:>8.0f} kB  in {row['gzip_ms']:.1f} ms")
+        if "br_bytes" in row:
+            print(f"   brotli   {row['br_bytes'] / 1024:>8.0f} kB  in {row['br_ms']:.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"💾 Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# benchmarks/stub_openai.py
+# Minimal OpenAI-compatible /chat/completions server with configurable latency.
+import argparse
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MEAL = {
+    "is_food": True,
+    "item_name": "Benchmark Pasta",
+    "meal_type": "lunch",
+    "is_composed_meal": True,
+    "estimated_weight_g": 350,
+    "nutrition": {"calories_kcal": 620, "protein_g": 24, "carbs_g": 80, "fat_g": 18, "fiber_g": 6},
+    "dietary_flags": ["vegetarian"],
+    "confidence_score": 0.8,
+    "reasoning": "Stubbed response",
+    "reply_text": "A hearty plate of pasta, about 620 kcal with 24g protein."
+}
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    jitter = 0.0
+    # Seeded so two runs see the same latency sequence (shared by all handler threads)
+    rng = random.Random()
+    MEAL_MARKER = "Current Meal Data: "
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+
+        content = self._content(body.get("messages", []))
+        payload = {
+            "id": f"gen-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps(content)},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 900, "completion_tokens": 180, "total_tokens": 1080, "cost": 0.00042}
+        }
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _content(self, messages):
+        images = [
+            part for msg in messages if isinstance(msg.get("content"), list)
+            for part in msg["content"] if part.get("type") == "image_url"
+        ]
+        if len(images) > 1:
+            items = [dict(MEAL, item_name=f"Item {i + 1}") for i in range(len(images))]
+            return {"is_food": True, "meal_name": "Benchmark Plate", "meal_type": "lunch",
+                    "items": items, "reply_text": MEAL["reply_text"]}
+        if images:
+            return MEAL
+        meal = self._current_meal(messages) or dict(MEAL)
+        # Stamp every item so each correction writes all of the meal's logs, the
+        # first correction of a meal included
+        stamp = f"Corrected {uuid.uuid4().hex[:8]}"
+        for item in [meal] + meal.get("items", []):
+            item["reasoning"] = stamp
+        return dict(meal, reply_text="Got it, updated.")
+
+    def _current_meal(self, messages):
+        # Corrections embed the meal (items + log_ids) in the prompt; echoing it back
+        # keeps every log matched by id, so each correction takes the same code path
+        for msg in messages:
+            content = msg.get("content")
+            if not isinstance(content, str) or self.MEAL_MARKER not in content: continue
+            start = content.index(self.MEAL_MARKER) + len(self.MEAL_MARKER)
+            try:
+                meal, _ = json.JSONDecoder().raw_decode(content, start)
+                return meal
+            except json.JSONDecodeError:
+                return None
+        return None
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub OpenAI-compatible completion server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per completion")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of random latency")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the jitter")
+    args = parser.parse_args()
+
+    StubHandler.latency = args.latency
+    StubHandler.jitter = args.jitter
+    StubHandler.rng = random.Random(args.seed)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    print(f"🧪 Stub OpenAI server on :{args.port} (latency {args.latency}s ± {args.jitter}s)")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# migrate_provider_response.py
+# One-off migration: moves message.provider_response into typed metric columns
+# plus the compressed provider_response_archive table, then reports the
+# message table size and scan time (EXPLAIN ANALYZE) before/after.
+import argparse
+import json
+import os
+import sys
+import zlib
+from uuid import uuid4
+
+sys.path.append(os.getcwd())
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.database import engine, ensure_added_columns
+from app.models import ProviderResponseArchive
+from app.orchestrator import purge_provider_archive
+
+BATCH_SIZE = 500
+
+def measure(conn):
+    size = conn.execute(text("SELECT pg_total_relation_size('message')")).scalar()
+    rows = conn.execute(text("SELECT count(*) FROM message")).scalar()
+    # Server-side execution time and pages touched, without client transfer/decoding noise
+    plan = conn.execute(text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) SELECT * FROM message")).scalar()
+    if isinstance(plan, str): plan = json.loads(plan)
+    scan = plan[0]["Plan"]
+    return {
+        "size_bytes": size,
+        "rows": rows,
+        "scan_ms": plan[0]["Execution Time"],
+        "scan_blocks": scan.get("Shared Hit Blocks", 0) + scan.get("Shared Read Blocks", 0),
+    }
+
+def metrics_from_payload(payload: dict):
+    usage = payload.get("usage") or {}
+    choices = payload.get("choices") or []
+    return {
+        "provider_model": payload.get("model"),
+        "provider_response_id": payload.get("id"),
+        "prompt_tokens": int(usage.get("prompt_tokens") or 0),
+        "completion_tokens": int(usage.get("completion_tokens") or 0),
+        "finish_reason": choices[0].get("finish_reason") if choices else None,
+    }
+
+def has_legacy_column(conn):
+    return conn.execute(text(
+        "SELECT 1 FROM information_schema.columns "
+        "WHERE table_name = 'message' AND column_name = 'provider_response'"
+    )).first() is not None
+
+def backfill():
+    """
+    Commits once per batch so locks and WAL stay bounded on large tables. Rows
+    that already have an archive entry are skipped, so an interrupted run resumes.
+    """
+    migrated = 0
+    last_id = None
+    while True:
+        with engine.begin() as conn:
+            last_id, count = _backfill_batch(conn, last_id)
+        if last_id is None: break
+        migrated += count
+        print(f"   ↳ migrated {migrated} messages")
+    return migrated
+
+def _backfill_batch(conn, last_id):
+    query = (
+        "SELECT id, timestamp, provider_response FROM message WHERE provider_response IS NOT NULL "
+        "AND NOT EXISTS (SELECT 1 FROM provider_response_archive a WHERE a.message_id = message.id)"
+    )
+    params = {"limit": BATCH_SIZE}
+    if last_id:
+        query += " AND id > :last_id"
+        params["last_id"] = last_id
+    rows = conn.execute(text(query + " ORDER BY id LIMIT :limit"), params).all()
+    if not rows: return None, 0
+
+    archive_rows = []
+    metric_rows = []
+    for msg_id, ts, payload in rows:
+        last_id = msg_id
+        if isinstance(payload, str): payload = json.loads(payload)
+        if not payload: continue
+        metric_rows.append({"id": msg_id, **metrics_from_payload(payload)})
+        archive_rows.append({
+            "id": uuid4(),
+            "message_id": msg_id,
+            "created_at": ts,
+            "payload": zlib.compress(json.dumps(payload).encode("utf-8")),
+        })
+
+    if metric_rows:
+        conn.execute(text(
+            "UPDATE message SET provider_model = :provider_model, provider_response_id = :provider_response_id, "
+            "prompt_tokens = :prompt_tokens, completion_tokens = :completion_tokens, finish_reason = :finish_reason "
+            "WHERE id = :id"
+        ), metric_rows)
+        conn.execute(ProviderResponseArchive.__table__.insert(), archive_rows)
+    return last_id, len(metric_rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Move message.provider_response into the compressed archive.")
+    parser.add_argument("--keep-column", action="store_true", help="Do not drop message.provider_response after backfilling")
+    parser.add_argument("--vacuum", action="store_true", help="Run VACUUM FULL on message to reclaim the freed space")
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        before = measure(conn)
+
+    # Normally already done by app startup (init_db), harmless to repeat
+    ensure_added_columns()
+
+    with engine.begin() as conn:
+        if not has_legacy_column(conn):
+            print("✅ message.provider_response already migrated.")
+            return
+        ProviderResponseArchive.__table__.create(conn, checkfirst=True)
+
+    print("📦 Backfilling metrics and archiving payloads...")
+    backfill()
+
+    if not args.keep_column:
+        # Own short transaction: the ACCESS EXCLUSIVE lock is held only for the drop itself
+        with engine.begin() as conn:
+            print("🗑️  Dropping message.provider_response")
+            conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+            conn.execute(text("ALTER TABLE message DROP COLUMN provider_response"))
+
+    with Session(engine) as session:
+        purge_provider_archive(session)
+
+    if args.vacuum:
+        # VACUUM cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            print("🧹 VACUUM FULL message...")
+            conn.execute(text("VACUUM FULL message"))
+
+    with engine.connect() as conn:
+        after = measure(conn)
+        archive_size = conn.execute(text("SELECT pg_total_relation_size('provider_response_archive')")).scalar()
+
+    print("=" * 60)
+    print(f"{'':<18}{'before':>18}{'after':>18}")
+    print(f"{'message size':<18}{before['size_bytes'] / 1024:>15.1f} kB{after['size_bytes'] / 1024:>15.1f} kB")
+    print(f"{'message scan':<18}{before['scan_ms']:>15.1f} ms{after['scan_ms']:>15.1f} ms")
+    print(f"{'scan buffers':<18}{before['scan_blocks']:>18}{after['scan_blocks']:>18}")
+    print(f"{'rows':<18}{before['rows']:>18}{after['rows']:>18}")
+    print(f"{'archive size':<18}{'':>18}{archive_size / 1024:>15.1f} kB")
+    if not args.vacuum and not args.keep_column:
+        print("ℹ️  Dropped column space is only reclaimed after a table rewrite (re-run with --vacuum).")
+
+if __name__ == "__main__":
+    main()